@@ -0,0 +1,189 @@
+from amaranth import *
+from amaranth.sim import Simulator
+from amaranth.lib import data, wiring
+from amaranth.lib.wiring import In, Out
+
+# BCD Accumulator
+#
+# Adds a delta per enabled cycle with decimal carry between the digits.
+# The delta is either given in BCD (same layout as the accumulator) or, with
+# delta_width set, as binary number that is converted with a combinatorial
+# double dabble. Priority: clr > load > en.
+# carry is set for one cycle when the addition wrapped around.
+
+def bcd_layout(digits):
+    return data.ArrayLayout(unsigned(4), digits)
+
+
+def binary_to_bcd(m, value, digits):
+    # combinatorial double dabble: add 3 to each digit >= 5, then shift in the next bit
+    bcd = [C(0, 4) for _ in range(digits)]
+    for bit in reversed(range(len(value))):
+        adjusted = [Mux(digit >= 5, digit + 3, digit)[:4] for digit in bcd]
+        shift_in = [value[bit]] + [digit[3] for digit in adjusted[:-1]]
+        bcd = [Signal(4, name=f"dabble_{bit}_{i}") for i in range(digits)]
+        for i in range(digits):
+            m.d.comb += bcd[i].eq(Cat(shift_in[i], adjusted[i][:3]))
+    return bcd
+
+
+class BCD_Accumulator(wiring.Component):
+
+    def __init__(self, digits = 4, delta_width = None):
+        self.digits = digits
+        self.delta_width = delta_width
+        if delta_width is None:
+            self.delta_digits = digits
+            delta_shape = bcd_layout(digits)
+        else:
+            self.delta_digits = len(str(2 ** delta_width - 1))
+            delta_shape = unsigned(delta_width)
+        super().__init__({
+            "en":         In(1),
+            "delta":      In(delta_shape),
+            "load":       In(1),
+            "load_value": In(bcd_layout(digits)),
+            "clr":        In(1),
+            "counter":    Out(bcd_layout(digits)),
+            "carry":      Out(1),
+        })
+
+    def elaborate(self, platform) -> Module:
+        m = Module()
+
+        if self.delta_width is None:
+            delta = [self.delta[i] for i in range(self.digits)]
+        else:
+            delta = binary_to_bcd(m, self.delta, self.delta_digits)
+
+        # digit wise addition with decimal carry
+        total = []
+        carry = C(0, 1)
+        for i in range(self.digits):
+            digit_sum = Signal(5, name=f"sum_{i}")
+            addend = delta[i] if i < len(delta) else 0
+            m.d.comb += digit_sum.eq(self.counter[i] + addend + carry)
+            total.append(Mux(digit_sum > 9, digit_sum - 10, digit_sum)[:4])
+            carry = digit_sum > 9
+
+        # delta digits beyond the accumulator width always wrap around
+        for digit in delta[self.digits:]:
+            carry = carry | digit.any()
+
+        with m.If(self.clr):
+            m.d.sync += self.counter.eq(0)
+            m.d.sync += self.carry.eq(0)
+        with m.Elif(self.load):
+            m.d.sync += self.counter.eq(self.load_value)
+            m.d.sync += self.carry.eq(0)
+        with m.Elif(self.en):
+            for i in range(self.digits):
+                m.d.sync += self.counter[i].eq(total[i])
+            m.d.sync += self.carry.eq(carry)
+        with m.Else():
+            m.d.sync += self.carry.eq(0)
+        return m
+
+
+if __name__ == "__main__":
+
+    def to_bcd(value, digits):
+        return [(value // 10 ** i) % 10 for i in range(digits)]
+
+    def model(value, delta, digits):
+        total = value + delta
+        return total % 10 ** digits, total >= 10 ** digits
+
+    def get_value(ctx, dut):
+        value = 0
+        for j in range(dut.digits):
+            value *= 10
+            value += ctx.get(dut.counter[dut.digits-1-j])
+        return value
+
+    def set_bcd(ctx, port, value, digits):
+        for i, digit in enumerate(to_bcd(value, digits)):
+            ctx.set(port[i], digit)
+
+    async def load(ctx, dut, value):
+        set_bcd(ctx, dut.load_value, value, dut.digits)
+        ctx.set(dut.load, 1)
+        await ctx.tick()
+        ctx.set(dut.load, 0)
+        assert get_value(ctx, dut) == value
+
+    async def add(ctx, dut, value, delta):
+        if dut.delta_width is None:
+            set_bcd(ctx, dut.delta, delta, dut.delta_digits)
+        else:
+            ctx.set(dut.delta, delta)
+        ctx.set(dut.en, 1)
+        await ctx.tick()
+        ctx.set(dut.en, 0)
+        expected_value, expected_carry = model(value, delta, dut.digits)
+        actual_value = get_value(ctx, dut)
+        actual_carry = ctx.get(dut.carry)
+        if (actual_value, actual_carry) != (expected_value, expected_carry):
+            print(f"{value} + {delta}: expected {expected_value} carry {expected_carry}, "
+                  f"actual {actual_value} carry {actual_carry}")
+            assert False
+        return expected_value
+
+    def testbench_bcd_delta(dut):
+        async def testbench(ctx):
+            # every value plus every delta
+            for value in range(10 ** dut.digits):
+                for delta in range(10 ** dut.delta_digits):
+                    await load(ctx, dut, value)
+                    await add(ctx, dut, value, delta)
+        return testbench
+
+    def testbench_binary_delta(dut):
+        async def testbench(ctx):
+            # every value plus every delta
+            for value in range(10 ** dut.digits):
+                for delta in range(2 ** dut.delta_width):
+                    await load(ctx, dut, value)
+                    await add(ctx, dut, value, delta)
+        return testbench
+
+    def testbench_control(dut):
+        async def testbench(ctx):
+            # accumulate, no change when disabled
+            value = 0
+            for delta in range(100):
+                value = await add(ctx, dut, value, delta)
+                await ctx.tick()
+                assert get_value(ctx, dut) == value
+                assert not ctx.get(dut.carry)
+
+            # clear has priority over load and add
+            set_bcd(ctx, dut.load_value, 1234, dut.digits)
+            ctx.set(dut.delta, 7)
+            ctx.set(dut.en, 1)
+            ctx.set(dut.load, 1)
+            ctx.set(dut.clr, 1)
+            await ctx.tick()
+            assert get_value(ctx, dut) == 0
+
+            # load has priority over add
+            ctx.set(dut.clr, 0)
+            await ctx.tick()
+            assert get_value(ctx, dut) == 1234
+
+            # add
+            ctx.set(dut.load, 0)
+            await ctx.tick()
+            assert get_value(ctx, dut) == 1241
+            ctx.set(dut.en, 0)
+        return testbench
+
+    for dut, testbench in [
+        (BCD_Accumulator(digits=2),                 testbench_bcd_delta),
+        (BCD_Accumulator(digits=2, delta_width=7),  testbench_binary_delta),
+        (BCD_Accumulator(digits=4, delta_width=12), testbench_control),
+    ]:
+        sim = Simulator(dut)
+        sim.add_clock(1e-6)
+        sim.add_testbench(testbench(dut))
+        sim.run()
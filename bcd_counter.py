@@ -14,25 +14,23 @@ class BCD_Counter(wiring.Component):
     def elaborate(self, platform) -> Module:
         m = Module()
 
-        with m.If(~self.en):
-            for i in range(4):
-                self.counter[i].eq(0)
-        with m.Elif(self.counter[0] < 9):
-            m.d.sync += self.counter[0].eq(self.counter[0] + 1)
-        with m.Else():
-            m.d.sync += self.counter[0].eq(0)
-            with m.If(self.counter[1] < 9):
-                m.d.sync += self.counter[1].eq(self.counter[1] + 1)
+        with m.If(self.en):
+            with m.If(self.counter[0] < 9):
+                m.d.sync += self.counter[0].eq(self.counter[0] + 1)
             with m.Else():
-                m.d.sync += self.counter[1].eq(0)
-                with m.If(self.counter[2] < 9):
-                    m.d.sync += self.counter[2].eq(self.counter[2] + 1)
+                m.d.sync += self.counter[0].eq(0)
+                with m.If(self.counter[1] < 9):
+                    m.d.sync += self.counter[1].eq(self.counter[1] + 1)
                 with m.Else():
-                    m.d.sync += self.counter[2].eq(0)
-                    with m.If(self.counter[3] < 9):
-                        m.d.sync += self.counter[3].eq(self.counter[3] + 1)
+                    m.d.sync += self.counter[1].eq(0)
+                    with m.If(self.counter[2] < 9):
+                        m.d.sync += self.counter[2].eq(self.counter[2] + 1)
                     with m.Else():
-                        m.d.sync += self.counter[3].eq(0)
+                        m.d.sync += self.counter[2].eq(0)
+                        with m.If(self.counter[3] < 9):
+                            m.d.sync += self.counter[3].eq(self.counter[3] + 1)
+                        with m.Else():
+                            m.d.sync += self.counter[3].eq(0)
         return m
 
 
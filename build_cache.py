@@ -0,0 +1,21 @@
+from amaranth.build.run import LocalBuildProducts
+import os
+
+# Content-hashed build cache
+#
+# Elaboration is cheap, place & route is not. The bitstream of the top level is
+# built in build/<digest>/, where digest is the hash of the build plan: the RTLIL
+# of the whole design, the constraints and the toolchain script. The RTLIL is
+# generated without source locations, so the digest neither depends on the
+# checkout directory nor on line numbers. An unchanged design reuses the bitstream.
+
+
+def build_cached(platform, elaboratable, name = "top", root = "build", **kwargs):
+    plan = platform.build(elaboratable, name=name, do_build=False, emit_src=False, **kwargs)
+    build_dir = os.path.join(root, plan.digest(size=8).hex())
+    if os.path.exists(os.path.join(build_dir, f"{name}.bin")):
+        print(f"{name}: cached bitstream in {build_dir}")
+        return LocalBuildProducts(build_dir)
+
+    print(f"{name}: building bitstream in {build_dir}")
+    return plan.execute_local(build_dir)
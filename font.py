@@ -150,8 +150,10 @@ class Font(wiring.Component):
 
     i_stream: In(stream.Signature(font_request))
     o_stream: Out(stream.Signature(unsigned(8)))
-    
-    read_active = Signal(1)
+
+    def __init__(self):
+        super().__init__()
+        self.read_active = Signal(1)
 
     def elaborate(self, platform) -> Module:
         m = Module()
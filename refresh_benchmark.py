@@ -0,0 +1,78 @@
+from amaranth.back import rtlil
+from amaranth.sim import Simulator
+from top import Thing, DISPLAY_HEIGHT
+
+# Refresh time against lane count and chain length
+#
+# Measures the clock cycles of one display update, from the Tick state that
+# starts it until the statemachine is idle again, and compares it with the pure
+# SPI time of the update. Cycles in which the SPI lanes wait for the font are
+# counted separately.
+
+PRESCALER = 1
+
+# SPI_Out: 8 clock periods plus final data hold, prescaler + 1 cycles per half period
+def spi_byte_cycles(prescaler):
+    return 17 * (prescaler + 1)
+
+# SPI_Out raises ready, Thing raises valid, SPI_Out accepts the byte
+SPI_HANDSHAKE_CYCLES = 3
+
+# SS is deasserted after each row to latch it into the MAX7219s
+def ss_gap_cycles(prescaler):
+    return prescaler + 2
+
+def spi_cycles(num_modules, lanes, prescaler = PRESCALER):
+    # register and data byte per module of a chain, all lanes in parallel
+    row_bytes = 2 * (num_modules // lanes)
+    row_cycles = row_bytes * (spi_byte_cycles(prescaler) + SPI_HANDSHAKE_CYCLES) + ss_gap_cycles(prescaler)
+    return DISPLAY_HEIGHT * row_cycles
+
+
+def measure_frame(num_modules, lanes, prescaler = PRESCALER):
+    dut = Thing(prescaler, num_modules=num_modules, lanes=lanes)
+    # the Tick cycle that starts the update
+    cycles = 1
+    font_wait = 0
+
+    async def testbench(ctx):
+        nonlocal cycles, font_wait
+        # init sequence complete and first update started
+        await ctx.tick().until(dut.idle)
+        await ctx.tick().until(~dut.idle)
+        while not ctx.get(dut.idle):
+            font_wait += ctx.get(dut.font_wait)
+            await ctx.tick()
+            cycles += 1
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(testbench)
+    sim.run()
+    return cycles, font_wait
+
+
+if __name__ == "__main__":
+    # font latency is hidden behind SPI time: frame time equals pure SPI time
+    for prescaler in range(4):
+        cycles, font_wait = measure_frame(4, 1, prescaler)
+        expected = spi_cycles(4, 1, prescaler)
+        print(f"prescaler {prescaler}: frame {cycles} cycles, SPI {expected} cycles, waiting for font {font_wait} cycles")
+        assert cycles == expected
+        assert font_wait == 0
+
+    lanes_list = [1, 2, 4]
+
+    # multi-lane designs must elaborate into hardware, not only simulate
+    for lanes in lanes_list:
+        rtlil.convert(Thing(PRESCALER, num_modules=8, lanes=lanes), ports=[])
+
+    print(f"{'modules':>8}" + "".join(f"{f'{lanes} lane(s)':>14}" for lanes in lanes_list))
+    for num_modules in [4, 8, 16]:
+        print(f"{num_modules:>8}", end="")
+        for lanes in lanes_list:
+            cycles, font_wait = measure_frame(num_modules, lanes)
+            assert cycles == spi_cycles(num_modules, lanes)
+            assert font_wait == 0
+            print(f"{cycles:>14}", end="")
+        print()
@@ -6,6 +6,7 @@ from amaranth.lib.wiring import In, Out
 from bcd_counter import BCD_Counter, bcd_counter
 from font import Font, font_request
 from spi_out import SPI_Out
+from build_cache import build_cached
 import os
 
 # constants
@@ -27,12 +28,22 @@ init_display = [
     [BRIGHTNESS_REG, 0x2 & 0x0f],
 ] 
 
+# independent display chains, each with its own SPI_Out
+LANES = 1
+
+# FPGA pins of each lane: SS, CLK, DATA
+spi_lane_pins = [
+    ["A2", "A1", "B1"],
+    ["C2", "C1", "D2"],
+    ["D1", "E2", "E1"],
+    ["G2", "H1", "J1"],
+]
+
 class Thing(Elaboratable):
 
     clock   = Signal(32)
 
     refresh = Signal(1)
-    digit   = Signal(2)
     counter = Array([Signal(4) for _ in range(4)])
     step    = Signal(6)
     spi_active = Signal(1)
@@ -42,56 +53,110 @@ class Thing(Elaboratable):
 
     spi_valid      = Signal(1)
     spi_ready      = Signal(1)
-    spi_payload    = Signal(8)
 
     bitmap_valid   = Signal(1)
     bitmap_ready   = Signal(1)
-    bitmap_payload = Signal(8)
 
-    def __init__(self, prescaler = 1):
+    # The display is split into `lanes` independent MAX7219 chains of
+    # num_modules / lanes modules each. Every lane has its own SPI_Out and Font
+    # instance, all lanes shift their bytes in lockstep.
+    def __init__(self, prescaler = 1, num_modules = NUM_MODULES, lanes = 1):
         super().__init__()
+        assert num_modules % lanes == 0
         self.prescaler = prescaler
         self.prescale_counter = Signal(range(prescaler+1))
+        self.num_modules = num_modules
+        self.lanes = lanes
+        self.chain_length = num_modules // lanes
+        # position within the chain of each lane
+        self.digit = Signal(range(self.chain_length))
+        self.row = Signal(3)
+        self.idle = Signal(1)
+        # SPI is ready for the data byte but the bitmap is not available yet
+        self.font_wait = Signal(1)
+        self.spi_payload    = [Signal(8, name=f"spi_payload_{lane}")    for lane in range(lanes)]
+        self.bitmap_payload = [Signal(8, name=f"bitmap_payload_{lane}") for lane in range(lanes)]
+        # prefetched bitmap of the data byte that follows the register byte in flight
+        self.bitmap_buffer  = [Signal(8, name=f"bitmap_buffer_{lane}")  for lane in range(lanes)]
+        self.bitmap_buffered = Signal(1)
 
 
     def elaborate(self, platform) -> Module:
         if platform is not None:
             half_freq = int(platform.default_clk_frequency // 2)
-            spi_ss   = platform.request("spi_ss").o
-            spi_clk  = platform.request("spi_clk").o
-            spi_data = platform.request("spi_data").o
+            spi_ss   = [platform.request("spi_ss",   lane).o for lane in range(self.lanes)]
+            spi_clk  = [platform.request("spi_clk",  lane).o for lane in range(self.lanes)]
+            spi_data = [platform.request("spi_data", lane).o for lane in range(self.lanes)]
             led      = platform.request("led").o
         else:
             half_freq = 2000 * self.prescaler
-            spi_ss    = Signal(1)
-            spi_clk   = Signal(1)
-            spi_data  = Signal(1)
+            spi_ss    = [Signal(1, name=f"spi_ss_{lane}")   for lane in range(self.lanes)]
+            spi_clk   = [Signal(1, name=f"spi_clk_{lane}")  for lane in range(self.lanes)]
+            spi_data  = [Signal(1, name=f"spi_data_{lane}") for lane in range(self.lanes)]
             led       = Signal(1)
 
         m = Module()
         m.submodules.bcd_counter = bcd_counter = BCD_Counter()
-        m.submodules.font        = font        = Font()
-        m.submodules.spi_out     = spi_out     = SPI_Out(self.prescaler)
-
-        # connect to font module
-        # wiring.connect(m, bitmap_producer = font.o_stream, bitmap_consumer = self.i_stream)
+        fonts   = []
+        spi_outs = []
+        for lane in range(self.lanes):
+            font    = Font()
+            spi_out = SPI_Out(self.prescaler)
+            m.submodules[f"font_{lane}"]    = font
+            m.submodules[f"spi_out_{lane}"] = spi_out
+            fonts.append(font)
+            spi_outs.append(spi_out)
+
+        # characters of all modules, modules without counter digit stay blank
+        characters = [self.counter[i] + 0x030 if i < len(self.counter) else C(0x20, 8)
+                      for i in range(self.num_modules)]
+
+        for lane, (font, spi_out) in enumerate(zip(fonts, spi_outs)):
+            # connect to font module
+            # wiring.connect(m, bitmap_producer = font.o_stream, bitmap_consumer = self.i_stream)
+            m.d.comb += [
+                self.bitmap_payload[lane].eq(font.o_stream.payload),
+                font.o_stream.ready.eq(self.bitmap_ready),
+                font.i_stream.payload.row.eq(self.row),
+            ]
+
+            # connect to SPI Out
+            # wiring.connect(m, display_producer = self.o_stream, display_consumer = spi_out.stream)
+            m.d.comb += [
+                spi_out.stream.valid.eq(self.spi_valid),
+                spi_out.stream.payload.eq(self.spi_payload[lane]),
+                spi_data[lane].eq(spi_out.spi_out),
+                spi_clk[lane].eq(spi_out.spi_clk),
+                # SS is active low
+                spi_ss[lane].eq(~spi_out.spi_ss),
+            ]
+
+        # all lanes run in lockstep
         m.d.comb += [
-            self.bitmap_payload.eq(font.o_stream.payload),
-            self.bitmap_valid.eq(font.o_stream.valid),
-            font.o_stream.ready.eq(self.bitmap_ready),
+            self.bitmap_valid.eq(Cat(font.o_stream.valid for font in fonts).all()),
+            self.spi_ready.eq(Cat(spi_out.stream.ready for spi_out in spi_outs).all()),
         ]
 
-        # connect to SPI Out
-        # wiring.connect(m, display_producer = self.o_stream, display_consumer = spi_out.stream)
-        m.d.comb += [
-            spi_out.stream.valid.eq(self.spi_valid),
-            spi_out.stream.payload.eq(self.spi_payload),
-            self.spi_ready.eq(spi_out.stream.ready),
-            spi_data.eq(spi_out.spi_out),
-            spi_clk.eq(spi_out.spi_clk),
-            # SS is active low
-            spi_ss.eq(~spi_out.spi_ss),
-        ]
+        def set_spi_en(value):
+            m.d.sync += [spi_out.en.eq(value) for spi_out in spi_outs]
+
+        def set_spi_payload(value):
+            m.d.sync += [payload.eq(value) for payload in self.spi_payload]
+
+        def send_register(digit):
+            # register byte of the current row, prefetch bitmap while it is shifted out
+            set_spi_en(1)
+            set_spi_payload(self.row + 1)
+            m.d.sync += self.spi_valid.eq(1)
+            for lane, font in enumerate(fonts):
+                lane_characters = Array(characters[lane * self.chain_length:(lane + 1) * self.chain_length])
+                m.d.sync += [
+                    # provide input to font module
+                    font.i_stream.payload.character.eq(lane_characters[digit]),
+                    font.i_stream.valid.eq(1),
+                ]
+            # we are ready to receive bitmap
+            m.d.sync += self.bitmap_ready.eq(1)
 
 
         # counter
@@ -104,22 +169,25 @@ class Thing(Elaboratable):
             m.d.sync += bcd_counter.en.eq(0)
             m.d.sync += self.clock.eq(self.clock + 1)
 
-        with m.FSM():
+        with m.FSM() as fsm:
+            m.d.comb += self.idle.eq(fsm.ongoing("Tick"))
+            m.d.comb += self.font_wait.eq(fsm.ongoing("SendUpdateW4Complete") & self.spi_ready & ~self.bitmap_buffered)
+
             with m.State("Init"):
                 m.d.sync += [
                     self.refresh.eq(1),
                     self.step.eq(0),
-                    self.digit.eq(NUM_MODULES - 1),
+                    self.digit.eq(self.chain_length - 1),
                     self.prescale_counter.eq(self.prescaler),
                 ]
                 m.next = "Config_SendReg"
 
             with m.State("Config_SendReg"):
-                m.d.sync += spi_out.en.eq(1) 
+                set_spi_en(1)
                 for i in range(len(init_display)):
                     reg, _ = init_display[i]
                     with m.If(self.step == i):
-                        m.d.sync += self.spi_payload.eq(reg)
+                        set_spi_payload(reg)
                 m.d.sync += self.spi_valid.eq(1)
                 with m.If(self.spi_ready):
                     m.next = "Config_W4SendRegActive"
@@ -137,7 +205,7 @@ class Thing(Elaboratable):
                 for i in range(len(init_display)):
                     _, value = init_display[i]
                     with m.If(self.step == i):
-                        m.d.sync += self.spi_payload.eq(value)
+                        set_spi_payload(value)
                 m.d.sync += self.spi_valid.eq(1)
                 with m.If(self.spi_ready):
                     m.next = "Config_W4SendValueActive"
@@ -156,12 +224,12 @@ class Thing(Elaboratable):
                     m.d.sync += self.digit.eq(self.digit - 1)
                     m.next = "Config_SendReg"
                 with m.Else():
-                    m.d.sync += spi_out.en.eq(0) 
+                    set_spi_en(0)
                     with m.If(self.prescale_counter > 0):
                         m.d.sync += self.prescale_counter.eq(self.prescale_counter - 1)
                     with m.Else():
                         m.d.sync += self.prescale_counter.eq(self.prescaler)
-                        m.d.sync += self.digit.eq(NUM_MODULES - 1)
+                        m.d.sync += self.digit.eq(self.chain_length - 1)
                         with m.If(self.step < (len(init_display) - 1)):
                             m.d.sync += self.step.eq(self.step + 1)
                             m.next = "Config_SendReg"
@@ -171,8 +239,8 @@ class Thing(Elaboratable):
             with m.State("Tick"):
                 with m.If(self.refresh):
                     m.d.sync += [
-                        self.digit.eq(NUM_MODULES - 1),
-                        font.i_stream.payload.row.eq(0),
+                        self.digit.eq(self.chain_length - 1),
+                        self.row.eq(0),
                         self.refresh.eq(0),
                     ]
                     # cache counter
@@ -181,12 +249,8 @@ class Thing(Elaboratable):
                     m.next = "SendUpdate"
 
             with m.State("SendUpdate"):
-                m.d.sync += [
-                    spi_out.en.eq(1),
-                    self.spi_valid.eq(1),
-                    self.spi_payload.eq(font.i_stream.payload.row + 1)
-                ]
                 with m.If(self.spi_ready):
+                    send_register(self.digit)
                     m.next = "SendUpdateW4Active"
 
             with m.State("SendUpdateW4Active"):
@@ -195,31 +259,12 @@ class Thing(Elaboratable):
                     m.next = "SendUpdateW4Complete"
 
             with m.State("SendUpdateW4Complete"):
-                with m.If(self.spi_ready):
-                    m.next = "GetRow"
-
-            with m.State("GetRow"):
-                m.d.sync += [
-                    # provide input to font module
-                    font.i_stream.payload.character.eq(self.counter[self.digit] + 0x030),
-                    font.i_stream.valid.eq(1),
-                    # we are ready to receive bitmap
-                    self.bitmap_ready.eq(1),
-                    # row active
-                    spi_out.en.eq(1) 
-                ]
-                m.next = "WaitForRow"
-
-            with m.State("WaitForRow"):
-                # when font modules provides bitmpap data
-                with m.If(self.bitmap_valid):
-                    # busy
-                    m.d.sync += self.bitmap_ready.eq(0)
-                    # no new request
-                    m.d.sync += font.i_stream.valid.eq(0)
-                    # cache bitmap
+                # send prefetched bitmap right after the register byte
+                with m.If(self.spi_ready & self.bitmap_buffered):
+                    m.d.sync += self.bitmap_buffered.eq(0)
                     m.d.sync += self.spi_valid.eq(1)
-                    m.d.sync += self.spi_payload.eq(self.bitmap_payload[::-1])
+                    for lane in range(self.lanes):
+                        m.d.sync += self.spi_payload[lane].eq(self.bitmap_buffer[lane])
                     m.next = "SentRowW4Active"
 
             with m.State("SentRowW4Active"):
@@ -229,24 +274,37 @@ class Thing(Elaboratable):
                     
             with m.State("SendRowW4Complete"):
                 with m.If(self.spi_ready):
-                    m.next = "RowSent"
+                    with m.If(self.digit > 0):
+                        # register byte for the next module right away
+                        m.d.sync += self.digit.eq(self.digit - 1)
+                        send_register(self.digit - 1)
+                        m.next = "SendUpdateW4Active"
+                    with m.Else():
+                        m.next = "RowSent"
 
             with m.State("RowSent"):
-                with m.If(self.digit > 0):
-                    m.d.sync += self.digit.eq(self.digit - 1)
-                    m.next = "SendUpdate"
+                set_spi_en(0)
+                with m.If(self.prescale_counter > 0):
+                    m.d.sync += self.prescale_counter.eq(self.prescale_counter - 1)
                 with m.Else():
-                    m.d.sync += spi_out.en.eq(0) 
-                    with m.If(self.prescale_counter > 0):
-                        m.d.sync += self.prescale_counter.eq(self.prescale_counter - 1)
+                    m.d.sync += self.prescale_counter.eq(self.prescaler)
+                    m.d.sync += self.digit.eq(self.chain_length - 1)
+                    with m.If(self.row < 7):
+                        m.d.sync += self.row.eq(self.row + 1)
+                        m.next = "SendUpdate"
                     with m.Else():
-                        m.d.sync += self.prescale_counter.eq(self.prescaler)
-                        m.d.sync += self.digit.eq(3)
-                        with m.If(font.i_stream.payload.row < 7):
-                            m.d.sync += font.i_stream.payload.row.eq(font.i_stream.payload.row + 1)
-                            m.next = "SendUpdate"
-                        with m.Else():
-                            m.next = "Tick"
+                        m.next = "Tick"
+
+        # when font modules provide bitmap data, fill prefetch buffer
+        with m.If(self.bitmap_valid & self.bitmap_ready):
+            # busy
+            m.d.sync += self.bitmap_ready.eq(0)
+            # no new request
+            m.d.sync += [font.i_stream.valid.eq(0) for font in fonts]
+            # cache bitmap
+            m.d.sync += self.bitmap_buffered.eq(1)
+            for lane in range(self.lanes):
+                m.d.sync += self.bitmap_buffer[lane].eq(self.bitmap_payload[lane][::-1])
 
         return m
 
@@ -263,60 +321,81 @@ async def stream_peek(ctx, stream_payload, stream_ready, stream_valid):
     return payload
 
 
-async def testbench(ctx):
-
-    # verify init sequence
-    for [expected_reg, expected_value] in init_display:
-        for _ in range(NUM_MODULES):
-            actual_reg   = await stream_peek(ctx, dut.spi_payload, dut.spi_ready, dut.spi_valid)
-            actual_value = await stream_peek(ctx, dut.spi_payload, dut.spi_ready, dut.spi_valid)
-            print(f"expected {expected_reg:02x} = {expected_value:02x} //  actual {actual_reg:02x} = {actual_value:02x}")
-            assert actual_reg   == expected_reg
-            assert actual_value == expected_value
-
-    for _ in range(10):
-        print("/" * 56)
-        for i in range(8):
-            for _ in range(4):
-                print("---", end="")
-                actual_reg   = await stream_peek(ctx, dut.spi_payload, dut.spi_ready, dut.spi_valid)
-                expected_reg = i + 1
-                if actual_reg != expected_reg:
-                    print(f"expected {expected_reg:02x}, actual {actual_reg:02x}")
-                    assert False
-                value = await stream_peek(ctx, dut.spi_payload, dut.spi_ready, dut.spi_valid)
-                for _ in range(8):
-                    if (value & 0x01) > 0:
-                        print("x", end="")
-                    else:
-                        print(" ", end="")
-
-                    value = value >> 1
-                print("---", end="")
-            print()
-        print("\\" * 56)
-
-        # wait for next tick
-        await ctx.tick().until(dut.refresh)
-
-dut = Thing(16)
-
-sim = Simulator(dut)
-sim.add_clock(1e-6)
-sim.add_testbench(testbench)
-
-with sim.write_vcd("top.vcd"):
-    sim.run()
-
-
-from amaranth_boards.tinyfpga_bx import TinyFPGABXPlatform
-from amaranth.build import Resource, Pins, Attrs
-
-# Connect pins
-platform = TinyFPGABXPlatform()
-platform.add_resources([
-    Resource("spi_ss",   0, Pins("A2", dir="o"), Attrs(IO_STANDARD="SB_LVCMOS")),
-    Resource("spi_clk",  0, Pins("A1", dir="o"), Attrs(IO_STANDARD="SB_LVCMOS")),
-    Resource("spi_data", 0, Pins("B1", dir="o"), Attrs(IO_STANDARD="SB_LVCMOS"))
-])
-platform.build(dut, do_program=False)
+async def lanes_peek(ctx, dut):
+    # one byte per lane, all lanes are loaded in parallel
+    payload = await stream_peek(ctx, Cat(dut.spi_payload), dut.spi_ready, dut.spi_valid)
+    return [(payload >> (8 * lane)) & 0xff for lane in range(dut.lanes)]
+
+
+def testbench_for(dut):
+    async def testbench(ctx):
+
+        # verify init sequence
+        for [expected_reg, expected_value] in init_display:
+            for _ in range(dut.chain_length):
+                actual_regs   = await lanes_peek(ctx, dut)
+                actual_values = await lanes_peek(ctx, dut)
+                for actual_reg, actual_value in zip(actual_regs, actual_values):
+                    print(f"expected {expected_reg:02x} = {expected_value:02x} //  actual {actual_reg:02x} = {actual_value:02x}")
+                    assert actual_reg   == expected_reg
+                    assert actual_value == expected_value
+
+        for _ in range(10):
+            print("/" * 14 * dut.num_modules)
+            for i in range(8):
+                bitmaps = [[] for _ in range(dut.lanes)]
+                for _ in range(dut.chain_length):
+                    actual_regs  = await lanes_peek(ctx, dut)
+                    expected_reg = i + 1
+                    for actual_reg in actual_regs:
+                        if actual_reg != expected_reg:
+                            print(f"expected {expected_reg:02x}, actual {actual_reg:02x}")
+                            assert False
+                    for lane, value in enumerate(await lanes_peek(ctx, dut)):
+                        bitmaps[lane].append(value)
+                for lane in reversed(range(dut.lanes)):
+                    for value in bitmaps[lane]:
+                        print("---", end="")
+                        for _ in range(8):
+                            if (value & 0x01) > 0:
+                                print("x", end="")
+                            else:
+                                print(" ", end="")
+
+                            value = value >> 1
+                        print("---", end="")
+                print()
+            print("\\" * 14 * dut.num_modules)
+
+            # wait for next tick
+            await ctx.tick().until(dut.refresh)
+    return testbench
+
+
+if __name__ == "__main__":
+
+    dut = Thing(16, lanes=LANES)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(testbench_for(dut))
+
+    with sim.write_vcd("top.vcd"):
+        sim.run()
+
+
+    from amaranth_boards.tinyfpga_bx import TinyFPGABXPlatform
+    from amaranth.build import Resource, Pins, Attrs
+
+    # Connect pins, one SS/CLK/DATA triple per lane
+    platform = TinyFPGABXPlatform()
+    for lane in range(LANES):
+        ss, clk, data = spi_lane_pins[lane]
+        platform.add_resources([
+            Resource("spi_ss",   lane, Pins(ss,   dir="o"), Attrs(IO_STANDARD="SB_LVCMOS")),
+            Resource("spi_clk",  lane, Pins(clk,  dir="o"), Attrs(IO_STANDARD="SB_LVCMOS")),
+            Resource("spi_data", lane, Pins(data, dir="o"), Attrs(IO_STANDARD="SB_LVCMOS"))
+        ])
+
+    # bitstream, only rebuilt if the build plan changed
+    build_cached(platform, dut)